@@ -6,6 +6,11 @@ the executable.
 
 import typing as ty
 
-from ._fixtures import mock_code_factory
+from ._fixtures import mock_code_factory, mock_code_batch_runner, mock_code_caching
+from ._benchmark import mock_code_benchmark, BenchmarkLoad, BenchmarkPolling
+from ._plugin import pytest_addoption, pytest_configure
 
-__all__: ty.Tuple[str, ...] = ('mock_code_factory', )
+__all__: ty.Tuple[str, ...] = (
+    'mock_code_factory', 'mock_code_batch_runner', 'mock_code_caching', 'mock_code_benchmark',
+    'BenchmarkLoad', 'BenchmarkPolling', 'pytest_addoption', 'pytest_configure'
+)
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Defines a pytest fixture for benchmarking the throughput of the AiiDA
+engine and daemon, using mock codes as a cheap and deterministic load.
+"""
+
+import os
+import time
+import typing as ty
+
+import pytest
+
+from ._env_keys import EnvKeys
+
+__all__ = ("mock_code_benchmark", "BenchmarkResult", "BenchmarkLoad", "BenchmarkPolling")
+
+_TERMINATED_STATES = ('finished', 'excepted', 'killed')
+
+
+class BenchmarkResult(ty.NamedTuple):
+    """
+    The measurements of a mock code benchmark run. Rates are given per
+    second, sizes in bytes, and times in seconds.
+    """
+    num_submitted: int
+    num_finished_ok: int
+    num_failed: int
+    wall_time: float
+    submission_rate: float
+    latency_percentiles: ty.Dict[int, float]
+    retrieve_throughput: float
+    node_count_growth: int
+    database_size_growth: int
+
+
+class BenchmarkLoad(ty.NamedTuple):
+    """
+    The artificial load applied by each mock code run. The ``runtime``
+    is the time in seconds that each run is delayed by, ``output_size``
+    the number of bytes which each run writes to the scheduler stderr,
+    and ``failure_rate`` the probability with which a run fails without
+    producing any outputs.
+    """
+    runtime: float = 0.
+    output_size: int = 0
+    failure_rate: float = 0.
+
+    def get_env(self) -> ty.Dict[str, ty.Any]:
+        """
+        Returns the environment variables of the mock code setting the load.
+        """
+        return {
+            EnvKeys.RUNTIME.value: self.runtime,
+            EnvKeys.OUTPUT_SIZE.value: self.output_size,
+            EnvKeys.FAILURE_RATE.value: self.failure_rate,
+        }
+
+
+class BenchmarkPolling(ty.NamedTuple):
+    """
+    The time in seconds between checks for terminated calculations,
+    and after which the benchmark is aborted.
+    """
+    poll_interval: float = 1.
+    timeout: float = 3600.
+
+
+@pytest.fixture(scope='function')
+def mock_code_benchmark(mock_code_factory):
+    """
+    Fixture to benchmark the AiiDA daemon by submitting a large number of
+    mock calculations. The daemon must be running for the test profile,
+    which can be achieved by using an existing profile through the
+    ``AIIDA_TEST_PROFILE`` environment variable. Otherwise, the test
+    is skipped.
+    """
+    def _run_benchmark(
+        process_class: ty.Any,
+        inputs: ty.Dict[str, ty.Any],
+        num_calculations: int = 1000,
+        load: BenchmarkLoad = BenchmarkLoad(),
+        percentiles: ty.Iterable[int] = (50, 90, 99),
+        polling: BenchmarkPolling = BenchmarkPolling(),
+        **mock_code_kwargs: ty.Any
+    ) -> BenchmarkResult:
+        """
+        Submits the calculation ``num_calculations`` times to the daemon,
+        waits until all of them have terminated, and returns the
+        measurements. The results for the given inputs should already
+        exist in the data directory, since the artificial load is only
+        applied when results are copied from there.
+
+        Parameters
+        ----------
+        process_class :
+            The calculation class to submit.
+        inputs :
+            The inputs of the calculation, except for the code.
+        num_calculations :
+            The number of calculations to submit.
+        load :
+            The artificial load applied by each mock code run.
+        percentiles :
+            The percentiles of the latency which are reported.
+        polling :
+            The options for waiting until the calculations terminate.
+        mock_code_kwargs :
+            The arguments of the mock code, see ``mock_code_factory``.
+        """
+        from aiida import orm
+        from aiida.engine import submit
+        from aiida.engine.daemon.client import get_daemon_client
+
+        if not get_daemon_client().is_daemon_running:
+            pytest.skip("The daemon is not running for the test profile.")
+
+        code = mock_code_factory(
+            extra_env={
+                **(mock_code_kwargs.pop('extra_env', None) or {}),
+                **load.get_env()
+            },
+            **mock_code_kwargs
+        )
+
+        node_count_start = orm.QueryBuilder().append(orm.Node).count()
+        database_size_start = _get_database_size()
+
+        time_start = time.monotonic()
+        pks = [submit(process_class, **inputs, code=code).pk for _ in range(num_calculations)]
+        submission_time = time.monotonic() - time_start
+        _wait_for_termination(pks, polling=polling)
+        wall_time = time.monotonic() - time_start
+
+        nodes = [orm.load_node(pk) for pk in pks]
+        latencies = sorted((node.mtime - node.ctime).total_seconds() for node in nodes)
+        num_finished_ok = sum(node.is_finished_ok for node in nodes)
+
+        return BenchmarkResult(
+            num_submitted=num_calculations,
+            num_finished_ok=num_finished_ok,
+            num_failed=num_calculations - num_finished_ok,
+            wall_time=wall_time,
+            submission_rate=num_calculations / submission_time,
+            latency_percentiles={
+                percentile: _get_percentile(latencies, percentile)
+                for percentile in percentiles
+            },
+            retrieve_throughput=sum(
+                _get_repository_size(node.outputs.retrieved)
+                for node in nodes if 'retrieved' in node.outputs
+            ) / wall_time,
+            node_count_growth=orm.QueryBuilder().append(orm.Node).count() - node_count_start,
+            database_size_growth=_get_database_size() - database_size_start
+        )
+
+    return _run_benchmark
+
+
+def _wait_for_termination(pks: ty.Iterable[int], polling: BenchmarkPolling) -> None:
+    """
+    Waits until all given processes have terminated.
+    """
+    from aiida import orm
+
+    time_start = time.monotonic()
+    pending = set(pks)
+    while pending:
+        if time.monotonic() - time_start > polling.timeout:
+            raise TimeoutError(
+                f"{len(pending)} calculations did not terminate "
+                f"within {polling.timeout} seconds."
+            )
+        time.sleep(polling.poll_interval)
+        query = orm.QueryBuilder().append(
+            orm.ProcessNode,
+            filters={
+                'id': {
+                    'in': list(pending)
+                },
+                'attributes.process_state': {
+                    'in': list(_TERMINATED_STATES)
+                }
+            },
+            project='id'
+        )
+        pending.difference_update(query.all(flat=True))
+
+
+def _get_percentile(sorted_values: ty.Sequence[float], percentile: int) -> float:
+    """
+    Returns the nearest-rank percentile of the sorted values.
+    """
+    if not sorted_values:
+        return float('nan')
+    index = max(0, -(-len(sorted_values) * percentile // 100) - 1)
+    return sorted_values[index]
+
+
+def _get_database_size() -> int:
+    """
+    Returns the size of the PostgreSQL database of the current profile.
+    """
+    from aiida.manage.manager import get_manager
+
+    query = 'SELECT pg_database_size(current_database());'
+    return int(get_manager().get_backend().execute_raw(query)[0][0])
+
+
+def _get_repository_size(node: ty.Any, path: ty.Optional[str] = None) -> int:
+    """
+    Returns the total size of the files in the repository of a node.
+    """
+    from aiida.orm.utils.repository import FileType
+
+    size = 0
+    for obj in node.list_objects(path):
+        obj_path = obj.name if path is None else os.path.join(path, obj.name)
+        if obj.type == FileType.DIRECTORY:
+            size += _get_repository_size(node, obj_path)
+        else:
+            with node.open(obj_path, 'rb') as handle:
+                size += len(handle.read())
+    return size
@@ -6,6 +6,10 @@ Implements the executable for running a mock AiiDA code.
 
 import os
 import sys
+import json
+import time
+import random
+import resource
 import pathlib
 import shutil
 import hashlib
@@ -14,8 +18,15 @@ import typing as ty
 import fnmatch
 
 from ._env_keys import EnvKeys
+from ._metadata import METADATA_FILE, read_metadata, write_metadata
+from ._delta import DeltaBaseError, encode_deltas, restore_delta_files
 
 SUBMIT_FILE = '_aiidasubmit.sh'
+# Stored in the '.aiida' folder, since it is excluded from the hash
+# and not copied to the result directory.
+ENTRY_MARKER_FILE = '.aiida/mock_code_entry'
+JOB_FILE = 'job.json'
+QUEUE_LOG_FILE = 'queued.jsonl'
 
 
 def run() -> None:
@@ -24,13 +35,16 @@ def run() -> None:
     simply copied over to the current working directory. Otherwise,
     the code will replace the executable in the aiidasubmit file,
     launch the "real" code, and then copy the results into the data
-    directory.
+    directory, together with the resources used by the real code.
+    In deferred mode, the "real" code is not launched, but queued to
+    be run at the end of the test session.
     """
     # Get environment variables
     label = os.environ[EnvKeys.LABEL.value]
     data_dir = os.environ[EnvKeys.DATA_DIR.value]
     executable_path = os.environ[EnvKeys.EXECUTABLE_PATH.value]
     ignore_files = os.environ[EnvKeys.IGNORE_FILES.value].split(':')
+    delta_max_depth = int(os.environ.get(EnvKeys.DELTA_MAX_DEPTH.value) or 0)
 
     hash_digest = get_hash().hexdigest()
     res_dir = pathlib.Path(data_dir) / f"mock-{label}-{hash_digest}"
@@ -41,26 +55,43 @@ def run() -> None:
 
         # replace executable path in submit file
         replace_submit_file(executable_path=executable_path)
-        subprocess.call(['bash', SUBMIT_FILE])
 
-        os.makedirs(res_dir)
+        deferred_dir = os.environ.get(EnvKeys.DEFERRED_DIR.value)
+        if deferred_dir:
+            queue_job(
+                queue_dir=pathlib.Path(deferred_dir),
+                res_dir=res_dir,
+                label=label,
+                ignore_files=ignore_files,
+                delta_max_depth=delta_max_depth
+            )
+            usage_file = os.environ.get(EnvKeys.USAGE_FILE.value)
+            if usage_file:
+                report_usage(
+                    usage_file=usage_file,
+                    label=label,
+                    res_dir=res_dir,
+                    saved_wall_time=0.,
+                    pending=True
+                )
+            sys.exit(f"Deferred running the code for '{res_dir.name}'.")
 
-        # Here we rely on getting the directory name before
-        # accessing its content, hence using os.walk.
-        for dirname, _, filenames in os.walk('.'):
-            if dirname.startswith('./.aiida'):
-                continue
-            os.makedirs(os.path.join(res_dir, dirname), exist_ok=True)
-            for filename in filenames:
-                if any(fnmatch.fnmatch(filename, expr) for expr in ignore_files):
-                    continue
-                file_path = os.path.join(dirname, filename)
-                res_file_path = os.path.join(res_dir, file_path)
-                shutil.copyfile(file_path, res_file_path)
+        resources = run_submit_file()
+        store_results(
+            res_dir=res_dir,
+            label=label,
+            ignore_files=ignore_files,
+            resources=resources,
+            delta_max_depth=delta_max_depth
+        )
+        saved_wall_time = 0.
 
     else:
+        simulate_load()
         # copy outputs into working directory
         for path in res_dir.iterdir():
+            if path.name == METADATA_FILE:
+                continue
             if path.is_dir():
                 shutil.rmtree(path.name, ignore_errors=True)
                 shutil.copytree(path, path.name)
@@ -68,17 +99,202 @@ def run() -> None:
                 shutil.copyfile(path, path.name)
             else:
                 sys.exit(f"Can not copy '{path.name}'.")
+        try:
+            restore_delta_files(res_dir)
+        except DeltaBaseError as exc:
+            sys.exit(str(exc))
+        write_output_padding()
+        saved_wall_time = read_metadata(res_dir).get('resources', {}).get('wall_time', 0.)
+
+    write_entry_marker(res_dir)
+    usage_file = os.environ.get(EnvKeys.USAGE_FILE.value)
+    if usage_file:
+        report_usage(
+            usage_file=usage_file, label=label, res_dir=res_dir, saved_wall_time=saved_wall_time
+        )
+
+
+def store_results(
+    res_dir: pathlib.Path,
+    label: str,
+    ignore_files: ty.Iterable[str],
+    resources: ty.Dict[str, ty.Any],
+    delta_max_depth: int,
+) -> None:
+    """
+    Copy the outputs in the current working directory to the result
+    directory, together with the metadata. The results are first
+    written to a temporary directory which is then renamed, such that
+    incomplete results are never visible to other runs.
+    """
+    res_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = res_dir.parent / f".tmp-{res_dir.name}-{os.getpid()}"
+    tmp_dir.mkdir()
+
+    # Here we rely on getting the directory name before
+    # accessing its content, hence using os.walk.
+    for dirname, _, filenames in os.walk('.'):
+        if dirname.startswith('./.aiida'):
+            continue
+        os.makedirs(os.path.join(tmp_dir, dirname), exist_ok=True)
+        for filename in filenames:
+            if any(fnmatch.fnmatch(filename, expr) for expr in ignore_files):
+                continue
+            file_path = os.path.join(dirname, filename)
+            res_file_path = os.path.join(tmp_dir, file_path)
+            shutil.copyfile(file_path, res_file_path)
+
+    resources['output_size'] = sum(
+        path.stat().st_size for path in tmp_dir.glob('**/*') if path.is_file()
+    )
+    metadata: ty.Dict[str, ty.Any] = {'resources': resources}
+    if delta_max_depth > 0:
+        delta = encode_deltas(res_dir=tmp_dir, label=label, max_depth=delta_max_depth)
+        if delta is not None:
+            metadata['delta'] = delta
+    write_metadata(tmp_dir, metadata)
+
+    try:
+        os.rename(tmp_dir, res_dir)
+    except OSError:
+        # The same result was stored by a concurrent run.
+        shutil.rmtree(tmp_dir)
+
+
+def queue_job(
+    queue_dir: pathlib.Path, res_dir: pathlib.Path, label: str, ignore_files: ty.Iterable[str],
+    delta_max_depth: int
+) -> None:
+    """
+    Copy the current working directory, with the already replaced
+    submit file, to the queue of deferred jobs, and append the result
+    directory name to the queue log. If the same job has already been
+    queued, it is only added to the log.
+    """
+    job_dir = queue_dir / res_dir.name
+    if not job_dir.exists():
+        tmp_dir = queue_dir / f".tmp-{res_dir.name}-{os.getpid()}"
+        shutil.copytree(
+            '.', tmp_dir / 'sandbox', symlinks=True, ignore=shutil.ignore_patterns('.aiida')
+        )
+        with open(tmp_dir / JOB_FILE, 'w') as job_file:
+            json.dump({
+                'res_dir': str(res_dir),
+                'label': label,
+                'ignore_files': list(ignore_files),
+                'delta_max_depth': delta_max_depth
+            }, job_file)
+        try:
+            os.rename(tmp_dir, job_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir)
+    with open(queue_dir / QUEUE_LOG_FILE, 'a') as queue_log:
+        queue_log.write(json.dumps({'entry': res_dir.name}) + '\n')
+
+
+def run_deferred_job(job_dir: str) -> None:
+    """
+    Run a job from the queue of deferred jobs, and store its results.
+    This changes the working directory, and should be run in a separate
+    process.
+    """
+    with open(os.path.join(job_dir, JOB_FILE)) as job_file:
+        job = json.load(job_file)
+    os.chdir(os.path.join(job_dir, 'sandbox'))
+    resources = run_submit_file()
+    store_results(
+        res_dir=pathlib.Path(job['res_dir']),
+        label=job['label'],
+        ignore_files=job['ignore_files'],
+        resources=resources,
+        delta_max_depth=job['delta_max_depth']
+    )
+
+
+def run_submit_file() -> ty.Dict[str, ty.Any]:
+    """
+    Run the AiiDA submit file, and return the wall time (in seconds),
+    CPU time (in seconds) and peak resident set size (in bytes) used
+    by the run.
+    """
+    usage_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+    time_start = time.monotonic()
+    subprocess.call(['bash', SUBMIT_FILE])
+    wall_time = time.monotonic() - time_start
+    usage_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    cpu_time = (usage_end.ru_utime +
+                usage_end.ru_stime) - (usage_start.ru_utime + usage_start.ru_stime)
+    # On Linux, 'ru_maxrss' is given in kilobytes.
+    return {'wall_time': wall_time, 'cpu_time': cpu_time, 'max_rss': usage_end.ru_maxrss * 1024}
+
+
+def simulate_load() -> None:
+    """
+    Applies the artificial runtime and failure rate set for
+    benchmarking. A failed run exits without copying the outputs.
+    """
+    time.sleep(float(os.environ.get(EnvKeys.RUNTIME.value) or 0))
+    failure_rate = float(os.environ.get(EnvKeys.FAILURE_RATE.value) or 0)
+    if random.random() < failure_rate:
+        sys.exit("Injected failure of the mock code.")
+
+
+def write_output_padding(chunk_size: int = 2**20) -> None:
+    """
+    Writes the number of bytes set for benchmarking to stderr, which
+    is retrieved by AiiDA as the scheduler stderr.
+    """
+    remaining = int(os.environ.get(EnvKeys.OUTPUT_SIZE.value) or 0)
+    while remaining > 0:
+        size = min(remaining, chunk_size)
+        sys.stderr.buffer.write(b'x' * size)
+        remaining -= size
+    sys.stderr.flush()
+
+
+def report_usage(
+    usage_file: str,
+    label: str,
+    res_dir: pathlib.Path,
+    saved_wall_time: float,
+    pending: bool = False
+) -> None:
+    """
+    Append the result directory which was used by this run, and the
+    wall time saved by not running the real code, to the usage file
+    of the pytest session. Results which are not yet recorded, since
+    running the real code was deferred, are marked as pending.
+    """
+    line = json.dumps({
+        'label': label,
+        'data_dir': str(res_dir.parent),
+        'entry': res_dir.name,
+        'saved_wall_time': saved_wall_time,
+        'pending': pending
+    })
+    # Write the line in a single call, since multiple mock codes may
+    # be appending to the same file concurrently.
+    with open(usage_file, 'a') as usage_file_obj:
+        usage_file_obj.write(line + '\n')
 
 
 def get_hash() -> 'hashlib._Hash':
     """
-    Get the MD5 hash for the current working directory.
+    Get the MD5 hash for the current working directory. Symbolic links
+    into mock code runs and to directories are identified by their
+    target instead of their content, see :func:`get_symlink_key`.
     """
     md5sum = hashlib.md5()
-    # Here the order needs to be consistent, thus globbing
-    # with 'sorted'.
-    for path in sorted(pathlib.Path('.').glob('**/*')):
-        if path.is_file() and not path.match('.aiida/**'):
+    # Here the order needs to be consistent, thus sorting the paths.
+    for path in sorted(_walk_paths('.')):
+        if path.match('.aiida/**'):
+            continue
+        symlink_key = get_symlink_key(path) if path.is_symlink() else None
+        if symlink_key is not None:
+            md5sum.update(path.name.encode())
+            md5sum.update(b'symlink:' + symlink_key.encode())
+        elif path.is_file():
             with open(path, 'rb') as file_obj:
                 file_content_bytes = file_obj.read()
             if path.name == SUBMIT_FILE:
@@ -89,6 +305,61 @@ def get_hash() -> 'hashlib._Hash':
     return md5sum
 
 
+def _walk_paths(root: str) -> ty.Iterator[pathlib.Path]:
+    """
+    Yields the paths of all files and directories below the root,
+    without descending into symbolic links to directories.
+    """
+    for dirname, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            yield pathlib.Path(dirname) / name
+
+
+def get_symlink_key(path: pathlib.Path) -> ty.Optional[str]:
+    """
+    Get the key identifying the target of a symbolic link. If the target
+    is inside the working directory of a mock code run, it is given by
+    the name of the result directory used by that run and the relative
+    path of the target. This makes the key independent of the location
+    of the working directory, and of the size of the target.
+
+    Other directories are identified by their path relative to the
+    current working directory if they are inside it, and otherwise by
+    the relative paths and contents of the files they contain. This
+    makes the key independent of the location of the target.
+    For other files, ``None`` is returned, and the file is hashed by
+    its content.
+    """
+    target = path.resolve()
+    for directory in [target, *target.parents]:
+        marker_path = directory / ENTRY_MARKER_FILE
+        if marker_path.is_file():
+            entry = marker_path.read_text().strip()
+            return f"{entry}/{target.relative_to(directory).as_posix()}"
+    if not target.is_dir():
+        return None
+    try:
+        return f"./{target.relative_to(pathlib.Path.cwd().resolve()).as_posix()}"
+    except ValueError:
+        pass
+    md5sum = hashlib.md5()
+    for sub_path in sorted(_walk_paths(str(target))):
+        if sub_path.is_file():
+            md5sum.update(sub_path.relative_to(target).as_posix().encode())
+            md5sum.update(sub_path.read_bytes())
+    return f"dir:{md5sum.hexdigest()}"
+
+
+def write_entry_marker(res_dir: pathlib.Path) -> None:
+    """
+    Write the name of the result directory used by this run into the
+    working directory, to identify symbolic links pointing to it.
+    """
+    os.makedirs(os.path.dirname(ENTRY_MARKER_FILE), exist_ok=True)
+    with open(ENTRY_MARKER_FILE, 'w') as marker_file:
+        marker_file.write(res_dir.name)
+
+
 def strip_submit_content(aiidasubmit_content_bytes: bytes) -> bytes:
     """
     Helper function to strip content which changes between
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Defines a pytest plugin which defers running the "real" code for
+missing mock code results to the end of the test session.
+"""
+
+import sys
+import shutil
+import pathlib
+import tempfile
+import subprocess
+import multiprocessing
+import typing as ty
+
+import pytest
+
+from ._cli import QUEUE_LOG_FILE, run_deferred_job
+from ._usage import SessionLog
+
+__all__ = ('DeferredRecorder', )
+
+DEFERRED_RECORDER_NAME = 'aiida_testing_mock_code_deferred_recorder'
+
+# Options which are not passed on to the pytest process running the
+# tests again, with a flag telling whether they take a value.
+_RERUN_DROPPED_OPTIONS = {
+    '--mock-code-defer-record': False,
+    '--mock-code-record-workers': True,
+    '--mock-code-select-changed': True,
+}
+
+
+def get_rerun_args(config) -> ty.List[str]:
+    """
+    Returns the command line arguments of the pytest session, without
+    the positional arguments and the options selecting tests or
+    deferring mock code runs, which do not apply when running the tests
+    with pending results again.
+    """
+    positional = set(config.args)
+    rerun_args: ty.List[str] = []
+    args = iter(config.invocation_params.args)
+    for arg in args:
+        option = arg.split('=', 1)[0]
+        if option in _RERUN_DROPPED_OPTIONS:
+            if _RERUN_DROPPED_OPTIONS[option] and '=' not in arg:
+                next(args, None)
+        elif arg not in positional:
+            rerun_args.append(arg)
+    return rerun_args
+
+
+class DeferredRecorder:
+    """
+    Pytest plugin which collects the jobs queued by the mock code
+    executables when a result is missing. Failing tests which queued a
+    job are reported as skipped. At the end of the session, the queued
+    jobs are run in parallel, and the affected tests whose jobs were
+    successful are run again in a separate pytest process, with the
+    same options but without deferring.
+    """
+    def __init__(self, max_workers: ty.Optional[int] = None):
+        """
+        Parameters
+        ----------
+        max_workers :
+            Maximum number of queued jobs run in parallel. By default,
+            the number of processors is used.
+        """
+        self._max_workers = max_workers
+        self.queue_dir = pathlib.Path(tempfile.mkdtemp())
+        self.queue_log = SessionLog(self.queue_dir / QUEUE_LOG_FILE)
+        self._offsets: ty.Dict[str, int] = {}
+        self._pending: ty.Dict[str, ty.Set[str]] = {}
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item):  # pylint: disable=missing-docstring
+        self._offsets[item.nodeid] = self.queue_log.size()
+        yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self, item):  # pylint: disable=missing-docstring
+        outcome = yield
+        report = outcome.get_result()
+        if report.when == 'teardown':
+            return
+        queued = self.queue_log.read_from(self._offsets[item.nodeid])
+        if not queued:
+            return
+        self._pending[item.nodeid] = {job['entry'] for job in queued}
+        if report.failed:
+            report.outcome = 'skipped'
+            report.longrepr = (
+                str(item.fspath), (item.location[1] or 0) + 1,
+                'Skipped: mock code results are pending, the test is run again at the end of the '
+                'session.'
+            )
+
+    # Run last, such that the usage file is written before the tests
+    # are run again.
+    @pytest.hookimpl(trylast=True)
+    def pytest_sessionfinish(self, session):  # pylint: disable=missing-docstring
+        terminal_reporter = session.config.pluginmanager.get_plugin('terminalreporter')
+        terminal_reporter.write_line('')
+        job_dirs = sorted(
+            path for path in self.queue_dir.iterdir()
+            if path.is_dir() and not path.name.startswith('.')
+        )
+        failed_jobs = set()
+        if job_dirs:
+            terminal_reporter.write_sep('=', f'running {len(job_dirs)} deferred mock code jobs')
+            # Each job runs in a new process, since it changes the working
+            # directory and measures the resources used by its children.
+            with multiprocessing.Pool(processes=self._max_workers, maxtasksperchild=1) as pool:
+                results = [(job_dir.name, pool.apply_async(run_deferred_job, (str(job_dir), )))
+                           for job_dir in job_dirs]
+                for name, result in results:
+                    try:
+                        result.get()
+                    except Exception as exc:  # pylint: disable=broad-except
+                        failed_jobs.add(name)
+                        terminal_reporter.write_line(f'{name}: failed ({exc!r})', red=True)
+                    else:
+                        terminal_reporter.write_line(f'{name}: stored')
+        shutil.rmtree(self.queue_dir, ignore_errors=True)
+
+        exit_statuses = [int(session.exitstatus)]
+        rerun = []
+        for nodeid, entries in self._pending.items():
+            if entries & failed_jobs:
+                terminal_reporter.write_line(
+                    f'{nodeid}: not run again, since its mock code jobs failed', red=True
+                )
+                exit_statuses.append(int(pytest.ExitCode.TESTS_FAILED))
+            else:
+                rerun.append(nodeid)
+        if rerun:
+            terminal_reporter.write_sep(
+                '=', f'running {len(rerun)} tests with pending mock code results'
+            )
+            rootpath = pathlib.Path(str(session.config.rootdir))
+            rerun_command = [
+                sys.executable, '-m', 'pytest', *get_rerun_args(session.config),
+                '--mock-code-no-defer-record', *(str(rootpath / nodeid) for nodeid in rerun)
+            ]
+            exit_statuses.append(
+                subprocess.call(rerun_command, cwd=str(session.config.invocation_params.dir))
+            )
+        # Keep the first failure, such that failures in the session are
+        # not hidden by a successful run of the pending tests.
+        session.exitstatus = next((status for status in exit_statuses if status != 0), 0)
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Implements the delta-encoded storage of mock code results, where the
+files of a result are stored as line-based deltas against the files of
+the most similar existing result with the same label.
+"""
+
+import json
+import difflib
+import hashlib
+import pathlib
+import typing as ty
+
+from ._metadata import METADATA_FILE, ENTRY_PREFIX, get_entry_label, read_metadata
+
+__all__ = (
+    'encode_deltas', 'restore_delta_files', 'read_entry_file', 'list_entry_files', 'DeltaBaseError'
+)
+
+# A delta is a list of operations, each of which is either a range
+# [start, stop] of lines copied from the base file, or a string of
+# inserted content. Bytes are stored as 'latin-1', which maps each
+# byte to one character.
+DeltaType = ty.List[ty.Union[ty.List[int], str]]
+
+_ENCODING = 'latin-1'
+
+
+class DeltaBaseError(Exception):
+    """
+    Raised when the base of a delta-encoded file was removed, or has
+    changed since the delta was computed.
+    """
+
+
+def compute_delta(base: bytes, content: bytes) -> DeltaType:
+    """
+    Computes the delta which turns the base into the given content.
+    """
+    base_lines = base.splitlines(keepends=True)
+    content_lines = content.splitlines(keepends=True)
+    delta: DeltaType = []
+    matcher = difflib.SequenceMatcher(None, base_lines, content_lines)
+    for tag, start, stop, content_start, content_stop in matcher.get_opcodes():
+        if tag == 'equal':
+            delta.append([start, stop])
+        elif content_stop > content_start:
+            delta.append(b''.join(content_lines[content_start:content_stop]).decode(_ENCODING))
+    return delta
+
+
+def apply_delta(base: bytes, delta: DeltaType) -> bytes:
+    """
+    Reconstructs the content from the base and the delta.
+    """
+    base_lines = base.splitlines(keepends=True)
+    parts: ty.List[bytes] = []
+    for operation in delta:
+        if isinstance(operation, str):
+            parts.append(operation.encode(_ENCODING))
+        else:
+            start, stop = operation
+            parts.extend(base_lines[start:stop])
+    return b''.join(parts)
+
+
+def _get_checksum(content: bytes) -> str:
+    return hashlib.md5(content).hexdigest()
+
+
+def _get_delta_info(res_dir: pathlib.Path) -> ty.Dict[str, ty.Any]:
+    return read_metadata(res_dir).get('delta', {})  # type: ignore
+
+
+def list_entry_files(res_dir: pathlib.Path) -> ty.List[str]:
+    """
+    Returns the relative paths of all files in a result directory,
+    including the delta-encoded ones.
+    """
+    files = {
+        path.relative_to(res_dir).as_posix()
+        for path in res_dir.glob('**/*') if path.is_file()
+    }
+    files.discard(METADATA_FILE)
+    files.update(_get_delta_info(res_dir).get('files', {}))
+    return sorted(files)
+
+
+def read_entry_file(res_dir: pathlib.Path, relpath: str) -> bytes:
+    """
+    Returns the content of a file in a result directory, reconstructing
+    it from its chain of deltas if needed. Raises a
+    :class:`DeltaBaseError` if the base of a delta was removed or has
+    changed.
+    """
+    delta_info = _get_delta_info(res_dir)
+    delta = delta_info.get('files', {}).get(relpath)
+    if delta is None:
+        return (res_dir / relpath).read_bytes()
+    base_name = delta_info['base']
+    try:
+        base = read_entry_file(res_dir.parent / base_name, relpath)
+    except FileNotFoundError as exc:
+        raise DeltaBaseError(
+            f"The file '{relpath}' of the base '{base_name}' of the result '{res_dir.name}' "
+            "does not exist. The result must be recorded again."
+        ) from exc
+    if _get_checksum(base) != delta_info.get('base_checksums', {}).get(relpath):
+        raise DeltaBaseError(
+            f"The file '{relpath}' of the base '{base_name}' has changed since the result "
+            f"'{res_dir.name}' was recorded. The result must be recorded again."
+        )
+    return apply_delta(base, delta)
+
+
+def restore_delta_files(res_dir: pathlib.Path) -> None:
+    """
+    Writes the delta-encoded files of a result directory to the current
+    working directory.
+    """
+    for relpath in _get_delta_info(res_dir).get('files', {}):
+        path = pathlib.Path(relpath)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(read_entry_file(res_dir, relpath))
+
+
+def _get_similarity(files: ty.Dict[str, bytes], res_dir: pathlib.Path) -> int:
+    """
+    Returns the number of bytes in lines which the files share with the
+    corresponding files of the result directory.
+    """
+    similarity = 0
+    for relpath in files.keys() & set(list_entry_files(res_dir)):
+        base_lines = set(read_entry_file(res_dir, relpath).splitlines())
+        similarity += sum(
+            len(line) + 1 for line in files[relpath].splitlines() if line in base_lines
+        )
+    return similarity
+
+
+def encode_deltas(res_dir: pathlib.Path, label: str,
+                  max_depth: int) -> ty.Optional[ty.Dict[str, ty.Any]]:
+    """
+    Replaces the files of a newly stored result directory by deltas
+    against the most similar result with the same label, if this makes
+    them smaller. Results whose chain of deltas already has the maximum
+    depth are not used as a base. Returns the delta information to be
+    stored in the metadata, or ``None`` if no file was replaced.
+    """
+    files = {relpath: (res_dir / relpath).read_bytes() for relpath in list_entry_files(res_dir)}
+
+    candidates = []
+    for path in sorted(res_dir.parent.iterdir()):
+        if (
+            path == res_dir or not path.is_dir() or not path.name.startswith(ENTRY_PREFIX)
+            or get_entry_label(path.name) != label
+        ):
+            continue
+        depth = _get_delta_info(path).get('depth', 0)
+        if depth < max_depth:
+            try:
+                candidates.append((_get_similarity(files, path), path.name, depth))
+            except DeltaBaseError:
+                continue
+    if not candidates:
+        return None
+    similarity, base_name, base_depth = max(candidates)
+    if similarity == 0:
+        return None
+
+    base_dir = res_dir.parent / base_name
+    base_files = set(list_entry_files(base_dir))
+    deltas = {}
+    base_checksums = {}
+    for relpath, content in files.items():
+        if relpath not in base_files:
+            continue
+        base = read_entry_file(base_dir, relpath)
+        delta = compute_delta(base, content)
+        if len(json.dumps(delta)) < len(content):
+            deltas[relpath] = delta
+            base_checksums[relpath] = _get_checksum(base)
+            (res_dir / relpath).unlink()
+    if not deltas:
+        return None
+    return {
+        'base': base_name,
+        'depth': base_depth + 1,
+        'files': deltas,
+        'base_checksums': base_checksums
+    }
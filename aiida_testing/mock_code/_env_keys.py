@@ -15,3 +15,9 @@ class EnvKeys(Enum):
     DATA_DIR = 'AIIDA_MOCK_DATA_DIR'
     EXECUTABLE_PATH = 'AIIDA_MOCK_EXECUTABLE_PATH'
     IGNORE_FILES = 'AIIDA_MOCK_IGNORE_FILES'
+    USAGE_FILE = 'AIIDA_MOCK_USAGE_FILE'
+    RUNTIME = 'AIIDA_MOCK_RUNTIME'
+    OUTPUT_SIZE = 'AIIDA_MOCK_OUTPUT_SIZE'
+    FAILURE_RATE = 'AIIDA_MOCK_FAILURE_RATE'
+    DELTA_MAX_DEPTH = 'AIIDA_MOCK_DELTA_MAX_DEPTH'
+    DEFERRED_DIR = 'AIIDA_MOCK_DEFERRED_DIR'
@@ -3,38 +3,50 @@
 Defines a pytest fixture for creating mock AiiDA codes.
 """
 
-import uuid
+import json
+import asyncio
+import hashlib
+import contextlib
 import shutil
-import inspect
 import pathlib
 import typing as ty
 
 import pytest
 
 from ._env_keys import EnvKeys
+from ._usage import USAGE_RECORDER_NAME
+from ._deferred import DEFERRED_RECORDER_NAME
 from .._config import get_config
 
-__all__ = ("mock_code_factory", )
+__all__ = ("mock_code_factory", "mock_code_batch_runner", "mock_code_caching")
+
+MOCK_CODE_CACHING_FIXTURE = 'mock_code_caching'
 
 
 @pytest.fixture(scope='function')
-def mock_code_factory(aiida_localhost):
+def mock_code_factory(aiida_localhost, request):
     """
     Fixture to create a mock AiiDA Code.
     """
     config = get_config().get('mock_code', {})
+    usage_recorder = request.config.pluginmanager.get_plugin(USAGE_RECORDER_NAME)
+    deferred_recorder = request.config.pluginmanager.get_plugin(DEFERRED_RECORDER_NAME)
 
     def _get_mock_code(
         label: str,
         entry_point: str,
         data_dir_abspath: ty.Union[str, pathlib.Path],
-        ignore_files: ty.Iterable[str] = ('_aiidasubmit.sh', )
+        ignore_files: ty.Iterable[str] = ('_aiidasubmit.sh', ),
+        extra_env: ty.Optional[ty.Mapping[str, ty.Any]] = None,
+        delta_max_depth: int = 0
     ):
         """
         Creates a mock AiiDA code. If the same inputs have been run previously,
         the results are copied over from the corresponding sub-directory of
         the ``data_dir_abspath``. Otherwise, the code is executed if an
         executable is specified in the configuration, or fails if it is not.
+        If a mock code with the same settings exists already, it is returned
+        instead of creating a new one.
 
         Parameters
         ----------
@@ -49,30 +61,154 @@ def mock_code_factory(aiida_localhost):
         ignore_files :
             A list of files which are not copied to the results directory
             when the code is executed.
+        extra_env :
+            Additional environment variables which are exported before
+            the mock code is run.
+        delta_max_depth :
+            If positive, the files of new results are stored as deltas
+            against the most similar existing result with the same
+            label, with chains of at most this many deltas. Results
+            used as a base must not be removed.
         """
-        from aiida.orm import Code
+        from aiida.orm import Code, Computer, QueryBuilder
+
+        env: ty.Dict[str, ty.Any] = {
+            EnvKeys.LABEL.value: label,
+            EnvKeys.DATA_DIR.value: data_dir_abspath,
+            EnvKeys.EXECUTABLE_PATH.value: config.get(label, ''),
+            EnvKeys.IGNORE_FILES.value: ':'.join(ignore_files),
+            EnvKeys.DELTA_MAX_DEPTH.value: delta_max_depth,
+        }
+        if usage_recorder is not None:
+            env[EnvKeys.USAGE_FILE.value] = usage_recorder.usage_log.path
+        if deferred_recorder is not None:
+            env[EnvKeys.DEFERRED_DIR.value] = deferred_recorder.queue_dir
+        env.update(extra_env or {})
+
+        if MOCK_CODE_CACHING_FIXTURE in request.fixturenames:
+            request.getfixturevalue(MOCK_CODE_CACHING_FIXTURE)(entry_point)
 
-        # we want to set a custom prepend_text, which is why the code
-        # can not be reused.
-        code_label = f'mock-{label}-{uuid.uuid4()}'
+        # The label is derived from the settings of the mock code, such
+        # that an existing code with the same settings can be reused.
+        # This also gives identical calculations the same hash, which
+        # is needed for AiiDA caching.
+        settings_hash = hashlib.md5(
+            json.dumps([entry_point, env], sort_keys=True, default=str).encode()
+        ).hexdigest()
+        code_label = f'mock-{label}-{settings_hash}'
+
+        query = QueryBuilder()
+        query.append(Computer, filters={'id': aiida_localhost.pk}, tag='computer')
+        query.append(Code, with_computer='computer', filters={'label': code_label})
+        existing_code = query.first()
+        if existing_code is not None:
+            return existing_code[0]
 
         executable_path = shutil.which('aiida-mock-code')
         code = Code(
             input_plugin_name=entry_point, remote_computer_exec=[aiida_localhost, executable_path]
         )
         code.label = code_label
-        code.set_prepend_text(
-            inspect.cleandoc(
-                f"""
-                export {EnvKeys.LABEL.value}={label}
-                export {EnvKeys.DATA_DIR.value}={data_dir_abspath}
-                export {EnvKeys.EXECUTABLE_PATH.value}={config.get(label, '')}
-                export {EnvKeys.IGNORE_FILES.value}={':'.join(ignore_files)}
-                """
-            )
-        )
+        code.set_prepend_text('\n'.join(f'export {key}={value}' for key, value in env.items()))
 
         code.store()
         return code
 
     return _get_mock_code
+
+
+@pytest.fixture(scope='function')
+def mock_code_batch_runner():
+    """
+    Fixture to run a batch of (mock) calculations concurrently. This
+    requires aiida-core 1.6 or later, where the engine is based on
+    ``asyncio``.
+    """
+    import aiida
+
+    aiida_version = tuple(int(part) for part in aiida.__version__.split('.')[:2])
+    if aiida_version < (1, 6):
+        raise RuntimeError(
+            "The 'mock_code_batch_runner' fixture requires aiida-core 1.6 or later, "
+            f"found version {aiida.__version__}."
+        )
+
+    def _run_batch(
+        batch: ty.Iterable[ty.Tuple[ty.Any, ty.Dict[str, ty.Any]]], max_concurrent: int = 8
+    ) -> ty.List[ty.Any]:
+        """
+        Runs the given processes concurrently in the event loop of the
+        current runner, and returns a list of ``(result, node)`` tuples
+        in the same order as the input, like ``run_get_node``. If any of
+        the processes fails, the first exception is raised once all of
+        them have terminated.
+
+        Parameters
+        ----------
+        batch :
+            The ``(process_class, inputs)`` pairs to run.
+        max_concurrent :
+            The maximum number of processes which are running at the
+            same time.
+        """
+        from aiida.engine.runners import ResultAndNode
+        from aiida.manage.manager import get_manager
+
+        if max_concurrent < 1:
+            raise ValueError(f"'max_concurrent' must be positive, got {max_concurrent}.")
+        runner = get_manager().get_runner()
+
+        async def _run_one(
+            semaphore: asyncio.Semaphore, process_class: ty.Any, inputs: ty.Dict[str, ty.Any]
+        ) -> ty.Any:
+            async with semaphore:
+                process = runner.instantiate_process(process_class, **inputs)
+                await process.step_until_terminated()
+            return ResultAndNode(process.result(), process.node)
+
+        async def _run_all() -> ty.List[ty.Any]:
+            # The semaphore needs to be created inside the runner's loop.
+            semaphore = asyncio.Semaphore(max_concurrent)
+            # Exceptions are collected, such that no process is left
+            # running in the runner's loop when one of them fails.
+            return await asyncio.gather(
+                *(_run_one(semaphore, process_class, inputs) for process_class, inputs in batch),
+                return_exceptions=True
+            )
+
+        results = runner.run_until_complete(_run_all())
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return list(results)
+
+    return _run_batch
+
+
+@pytest.fixture(scope='function')
+def mock_code_caching(request):
+    """
+    Fixture to enable AiiDA caching for the calculations run with mock
+    codes in the test. Identical calculations are then cloned from the
+    database instead of being run again. Caching is enabled for the
+    entry points of the mock codes created by ``mock_code_factory``.
+
+    Caching is not enabled while the usage of mock code results is
+    recorded, since the results used by cloned calculations are unknown.
+    """
+    from aiida.manage.caching import enable_caching
+
+    usage_recorder = request.config.pluginmanager.get_plugin(USAGE_RECORDER_NAME)
+
+    with contextlib.ExitStack() as stack:
+        enabled_entry_points: ty.Set[str] = set()
+
+        def _enable_caching(entry_point: str) -> None:
+            """
+            Enables caching for the given calculation entry point.
+            """
+            if usage_recorder is None and entry_point not in enabled_entry_points:
+                stack.enter_context(enable_caching(identifier=f'aiida.calculations:{entry_point}'))
+                enabled_entry_points.add(entry_point)
+
+        yield _enable_caching
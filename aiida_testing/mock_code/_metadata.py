@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Defines helpers for the names of the mock code result directories, and
+for the metadata file stored in them.
+"""
+
+import json
+import pathlib
+import typing as ty
+
+__all__ = ('METADATA_FILE', 'ENTRY_PREFIX', 'get_entry_label', 'read_metadata', 'write_metadata')
+
+METADATA_FILE = '.aiida-mock-code.json'
+ENTRY_PREFIX = 'mock-'
+
+
+def get_entry_label(entry: str) -> str:
+    """
+    Returns the code label from a result directory name of the form
+    ``mock-{label}-{hash}``.
+    """
+    return entry[len(ENTRY_PREFIX):].rsplit('-', 1)[0]
+
+
+def read_metadata(res_dir: pathlib.Path) -> ty.Dict[str, ty.Any]:
+    """
+    Read the metadata stored with a result directory. Results which
+    were recorded by an earlier version have no metadata.
+    """
+    metadata_path = res_dir / METADATA_FILE
+    if not metadata_path.exists():
+        return {}
+    with open(metadata_path) as metadata_file:
+        return json.load(metadata_file)  # type: ignore
+
+
+def write_metadata(res_dir: pathlib.Path, metadata: ty.Dict[str, ty.Any]) -> None:
+    """
+    Write the metadata of a result directory.
+    """
+    with open(res_dir / METADATA_FILE, 'w') as metadata_file:
+        json.dump(metadata, metadata_file, indent=2, sort_keys=True)
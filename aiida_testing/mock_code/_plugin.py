@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Defines the pytest hooks for the command line options of the mock code.
+"""
+
+import pytest
+
+from ._usage import UsageRecorder, ChangeSelector, USAGE_RECORDER_NAME, CHANGE_SELECTOR_NAME
+from ._deferred import DeferredRecorder, DEFERRED_RECORDER_NAME
+
+__all__ = ('pytest_addoption', 'pytest_configure')
+
+
+def pytest_addoption(parser):
+    """
+    Adds the command line options of the mock code.
+    """
+    group = parser.getgroup('aiida_testing_mock_code', 'aiida-testing mock code')
+    group.addoption(
+        '--mock-code-record-usage',
+        metavar='PATH',
+        default=None,
+        help='Record which mock code results are used by each test, and write them to PATH.'
+    )
+    group.addoption(
+        '--mock-code-select-changed',
+        metavar='BASELINE',
+        default=None,
+        help=(
+            'Run only the tests whose mock code results or executables changed since the '
+            'BASELINE usage file was recorded, and tests which are not contained in it.'
+        )
+    )
+    group.addoption(
+        '--mock-code-defer-record',
+        action='store_true',
+        default=False,
+        help=(
+            'Instead of running the real code when a mock code result is missing, run all '
+            'missing results in parallel at the end of the session, and then run the affected '
+            'tests again.'
+        )
+    )
+    group.addoption(
+        '--mock-code-no-defer-record',
+        action='store_false',
+        dest='mock_code_defer_record',
+        help='Disable --mock-code-defer-record, for example if it is set in addopts.'
+    )
+    group.addoption(
+        '--mock-code-record-workers',
+        metavar='N',
+        type=int,
+        default=None,
+        help='Number of deferred jobs run in parallel. Defaults to the number of CPUs.'
+    )
+
+
+def pytest_configure(config):
+    """
+    Registers the plugins selected by the command line options.
+    """
+    record_usage = config.getoption('mock_code_record_usage')
+    if record_usage:
+        config.pluginmanager.register(UsageRecorder(record_usage), USAGE_RECORDER_NAME)
+    select_changed = config.getoption('mock_code_select_changed')
+    if select_changed:
+        config.pluginmanager.register(ChangeSelector(select_changed), CHANGE_SELECTOR_NAME)
+    if config.getoption('mock_code_defer_record'):
+        if hasattr(config, 'workerinput') or getattr(config.option, 'numprocesses', None):
+            raise pytest.UsageError(
+                '--mock-code-defer-record can not be used together with pytest-xdist.'
+            )
+        config.pluginmanager.register(
+            DeferredRecorder(max_workers=config.getoption('mock_code_record_workers')),
+            DEFERRED_RECORDER_NAME
+        )
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Defines pytest plugins for recording which mock code results are used
+by each test, and for selecting only the tests affected by changes to
+these results.
+"""
+
+import json
+import shutil
+import hashlib
+import pathlib
+import tempfile
+import typing as ty
+
+import pytest
+
+from ._metadata import ENTRY_PREFIX, get_entry_label, read_metadata
+from .._config import get_config
+
+__all__ = (
+    'UsageRecorder', 'ChangeSelector', 'get_affected_tests', 'get_entry_fingerprints',
+    'get_relative_data_dir'
+)
+
+USAGE_RECORDER_NAME = 'aiida_testing_mock_code_usage_recorder'
+CHANGE_SELECTOR_NAME = 'aiida_testing_mock_code_change_selector'
+
+# Key under which pytest-xdist workers pass their usage to the controller.
+WORKER_OUTPUT_KEY = 'aiida_testing_mock_code_usage'
+
+
+class SessionLog:
+    """
+    A file to which the mock code executables append JSON lines during
+    a pytest session. Since the calculations in a test are run while
+    the test is executing, the lines can be attributed to a test by
+    comparing the file size before and after the test.
+    """
+    def __init__(self, path: ty.Union[str, pathlib.Path]):
+        self.path = pathlib.Path(path)
+        self.path.touch()
+
+    def size(self) -> int:
+        """
+        Returns the current size of the file, in bytes.
+        """
+        return self.path.stat().st_size
+
+    def read_from(self, offset: int) -> ty.List[ty.Dict[str, ty.Any]]:
+        """
+        Returns the lines which were written after the given offset.
+        """
+        with open(self.path, 'rb') as log_file:
+            log_file.seek(offset)
+            content = log_file.read().decode()
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def get_entry_fingerprint(entry_path: pathlib.Path) -> str:
+    """
+    Get the MD5 hash of the file names and contents of a result
+    directory. For delta-encoded results, the fingerprint of the base
+    result is included.
+    """
+    md5sum = hashlib.md5()
+    for path in sorted(entry_path.glob('**/*')):
+        if path.is_file():
+            md5sum.update(str(path.relative_to(entry_path)).encode())
+            with open(path, 'rb') as file_obj:
+                md5sum.update(file_obj.read())
+    base = read_metadata(entry_path).get('delta', {}).get('base')
+    if base is not None:
+        md5sum.update(get_entry_fingerprint(entry_path.parent / base).encode())
+    return md5sum.hexdigest()
+
+
+def get_entry_fingerprints(data_dir: ty.Union[str, pathlib.Path]) -> ty.Dict[str, str]:
+    """
+    Returns the fingerprints of all result directories in a data
+    directory, indexed by the directory name.
+    """
+    data_path = pathlib.Path(data_dir)
+    if not data_path.is_dir():
+        return {}
+    return {
+        path.name: get_entry_fingerprint(path)
+        for path in sorted(data_path.iterdir())
+        if path.is_dir() and path.name.startswith(ENTRY_PREFIX)
+    }
+
+
+def get_relative_data_dir(data_dir: str, root_dir: ty.Union[str, pathlib.Path]) -> str:
+    """
+    Returns the path of a data directory relative to the root directory
+    of the tests, such that the usage file does not depend on the
+    location of the checkout. Data directories outside the root
+    directory are returned unchanged.
+    """
+    try:
+        return pathlib.Path(data_dir).relative_to(root_dir).as_posix()
+    except ValueError:
+        return data_dir
+
+
+def get_affected_tests(
+    baseline: ty.Dict[str, ty.Any],
+    executables: ty.Dict[str, str],
+    root_dir: ty.Union[str, pathlib.Path] = '.'
+) -> ty.Set[str]:
+    """
+    Returns the node IDs of the tests in the baseline which are affected
+    by changes to the mock code results or the configured executables.
+
+    A test is affected if a result directory it used was removed or
+    re-recorded, if a new result directory was added for a label and
+    data directory it used, or if the executable of a label it used
+    has changed.
+
+    Parameters
+    ----------
+    baseline :
+        The usage file written by the :class:`UsageRecorder`.
+    executables :
+        The currently configured executables, indexed by code label.
+    root_dir :
+        The directory to which the relative data directories in the
+        baseline are resolved.
+    """
+    changed_entries: ty.Set[ty.Tuple[str, str]] = set()
+    added_labels: ty.Set[ty.Tuple[str, str]] = set()
+    for data_dir, old_fingerprints in baseline['entries'].items():
+        new_fingerprints = get_entry_fingerprints(pathlib.Path(root_dir) / data_dir)
+        for entry in old_fingerprints.keys() | new_fingerprints.keys():
+            if old_fingerprints.get(entry) != new_fingerprints.get(entry):
+                changed_entries.add((data_dir, entry))
+                if entry not in old_fingerprints:
+                    added_labels.add((data_dir, get_entry_label(entry)))
+
+    old_executables = baseline['executables']
+    changed_labels = {
+        label
+        for label in old_executables.keys() | executables.keys()
+        if old_executables.get(label) != executables.get(label)
+    }
+
+    def _is_affected(usage: ty.Dict[str, str]) -> bool:
+        return ((usage['data_dir'], usage['entry']) in changed_entries
+                or (usage['data_dir'], usage['label']) in added_labels
+                or usage['label'] in changed_labels)
+
+    return {
+        nodeid
+        for nodeid, usages in baseline['tests'].items()
+        if any(_is_affected(usage) for usage in usages)
+    }
+
+
+def _get_executables() -> ty.Dict[str, str]:
+    return get_config().get('mock_code', {})  # type: ignore
+
+
+class UsageRecorder:
+    """
+    Pytest plugin which records the mock code results used by each
+    test, and writes them to a usage file at the end of the session.
+    Tests which were not run in the session, or which are waiting for
+    deferred results, keep their previously recorded usage. With
+    pytest-xdist, the workers pass their usage to the controller, which
+    writes the usage file.
+    """
+    def __init__(self, output_path: ty.Union[str, pathlib.Path]):
+        self._output_path = pathlib.Path(output_path)
+        self._tmp_dir = tempfile.mkdtemp()
+        self.usage_log = SessionLog(pathlib.Path(self._tmp_dir) / 'usage.jsonl')
+        self._usage: ty.Dict[str, ty.List[ty.Dict[str, str]]] = {}
+        self._saved_wall_time = 0.
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item):  # pylint: disable=missing-docstring
+        offset = self.usage_log.size()
+        yield
+        usages = self.usage_log.read_from(offset)
+        self._saved_wall_time += sum(usage.get('saved_wall_time', 0.) for usage in usages)
+        if any(usage.get('pending', False) for usage in usages):
+            # The usage is incomplete, and the test keeps its previous
+            # usage unless it is run again after the results are recorded.
+            return
+        root_dir = str(item.config.rootdir)
+        self._usage[item.nodeid] = [{
+            'label': usage['label'],
+            'data_dir': get_relative_data_dir(usage['data_dir'], root_dir),
+            'entry': usage['entry']
+        } for usage in usages]
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node, error):  # pylint: disable=missing-docstring,unused-argument
+        worker_usage = getattr(node, 'workeroutput', {}).get(WORKER_OUTPUT_KEY)
+        if worker_usage is not None:
+            self._usage.update(worker_usage['tests'])
+            self._saved_wall_time += worker_usage['saved_wall_time']
+
+    def pytest_terminal_summary(self, terminalreporter):  # pylint: disable=missing-docstring
+        num_used = sum(len(usages) for usages in self._usage.values())
+        terminalreporter.write_line(
+            f"aiida-testing: {num_used} mock code runs, saving {self._saved_wall_time:.1f}s "
+            "of recorded run time."
+        )
+
+    def pytest_sessionfinish(self, session):  # pylint: disable=missing-docstring
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        workeroutput = getattr(session.config, 'workeroutput', None)
+        if workeroutput is not None:
+            workeroutput[WORKER_OUTPUT_KEY] = {
+                'tests': self._usage,
+                'saved_wall_time': self._saved_wall_time
+            }
+            return
+
+        tests: ty.Dict[str, ty.List[ty.Dict[str, str]]] = {}
+        if self._output_path.exists():
+            with open(self._output_path) as usage_file:
+                tests.update(json.load(usage_file)['tests'])
+        tests.update(self._usage)
+
+        root_dir = pathlib.Path(str(session.config.rootdir))
+        data_dirs = sorted({usage['data_dir'] for usages in tests.values() for usage in usages})
+        entries = {data_dir: get_entry_fingerprints(root_dir / data_dir) for data_dir in data_dirs}
+        result = {'executables': _get_executables(), 'entries': entries, 'tests': tests}
+        with open(self._output_path, 'w') as usage_file:
+            json.dump(result, usage_file, indent=2, sort_keys=True)
+
+
+class ChangeSelector:
+    """
+    Pytest plugin which deselects the tests that are not affected by
+    changes since the given baseline usage file. Tests which are not
+    contained in the baseline are always run.
+    """
+    def __init__(self, baseline_path: ty.Union[str, pathlib.Path]):
+        with open(baseline_path) as baseline_file:
+            self._baseline = json.load(baseline_file)
+
+    def pytest_collection_modifyitems(self, config, items):  # pylint: disable=missing-docstring
+        affected = get_affected_tests(
+            self._baseline, executables=_get_executables(), root_dir=str(config.rootdir)
+        )
+        known = self._baseline['tests'].keys()
+        selected = []
+        deselected = []
+        for item in items:
+            if item.nodeid in affected or item.nodeid not in known:
+                selected.append(item)
+            else:
+                deselected.append(item)
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = selected
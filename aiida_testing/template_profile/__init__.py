@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+Defines a fixture for setting up the AiiDA test profile from a template
+database, which is created only once per test session.
+"""
+
+import typing as ty
+
+from ._fixtures import aiida_template_profile
+
+__all__: ty.Tuple[str, ...] = ('aiida_template_profile', )
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Defines a pytest fixture for setting up the AiiDA test profile from a
+template database.
+"""
+
+import os
+import sys
+import fcntl
+import shutil
+import pathlib
+import subprocess
+
+import pytest
+
+__all__ = ("aiida_template_profile", )
+
+TEMPLATE_DIR_NAME = 'aiida-template'
+
+
+@pytest.fixture(scope='session')
+def aiida_template_profile(tmp_path_factory):
+    """
+    Fixture to set up a temporary AiiDA test profile by copying a
+    template database cluster, which is created only once and shared
+    between all pytest-xdist workers. To use it instead of the default
+    test profile, override the ``aiida_profile`` fixture in the
+    ``conftest.py``::
+
+        @pytest.fixture(scope='session', autouse=True)
+        def aiida_profile(aiida_template_profile):
+            yield aiida_template_profile
+
+    If an existing test profile is set by the ``AIIDA_TEST_PROFILE``
+    environment variable, it is used instead.
+    """
+    # pylint: disable=protected-access
+    from aiida.common.log import configure_logging
+    from aiida.common.utils import Capturing
+    from aiida.manage.tests import (
+        _GLOBAL_TEST_MANAGER, test_manager, get_test_backend_name, get_test_profile_name
+    )
+    from ._manager import TemplateProfileManager, TEMPLATE_INFO_FILE
+
+    profile_name = get_test_profile_name()
+    if profile_name:
+        with test_manager(profile_name=profile_name) as manager:
+            yield manager
+        return
+
+    # With pytest-xdist, the base temporary directory is specific to
+    # the worker, but its parent is shared between workers.
+    root_dir = tmp_path_factory.getbasetemp()
+    if os.environ.get('PYTEST_XDIST_WORKER'):
+        root_dir = root_dir.parent
+    template_dir = pathlib.Path(root_dir) / TEMPLATE_DIR_NAME
+
+    with open(pathlib.Path(root_dir) / f'{TEMPLATE_DIR_NAME}.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if not (template_dir / TEMPLATE_INFO_FILE).exists():
+                # Remove the remains of a failed attempt.
+                shutil.rmtree(template_dir, ignore_errors=True)
+                template_dir.mkdir()
+                # The template is built in a separate process, since
+                # loading its profile can not be undone.
+                subprocess.run([
+                    sys.executable, '-m', 'aiida_testing.template_profile._manager',
+                    str(template_dir),
+                    get_test_backend_name()
+                ],
+                               check=True)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    manager = TemplateProfileManager(template_dir=template_dir)
+    try:
+        with Capturing():
+            manager.create_profile()
+    except Exception:
+        manager.destroy_all()
+        raise
+    _GLOBAL_TEST_MANAGER._manager = manager
+    try:
+        configure_logging(with_orm=True)
+        yield _GLOBAL_TEST_MANAGER
+    finally:
+        _GLOBAL_TEST_MANAGER.destroy_all()
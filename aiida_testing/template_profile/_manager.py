@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Defines the creation of the template database, and a profile manager
+which sets up the test profile from a copy of it.
+"""
+
+import os
+import sys
+import json
+import shutil
+import pathlib
+import tempfile
+
+from aiida.manage import configuration
+from aiida.manage.external.postgres import Postgres
+from aiida.manage.tests import TemporaryProfileManager, TestManagerError
+
+__all__ = ('TemplateProfileManager', 'build_template')
+
+TEMPLATE_INFO_FILE = 'template.json'
+LOCALHOST_LABEL = 'localhost-test'
+
+
+def build_template(template_dir: pathlib.Path, backend: str) -> None:
+    """
+    Creates a database cluster containing a fully migrated AiiDA
+    database, the default user and the ``localhost-test`` computer used
+    by the ``aiida_localhost`` fixture. The info file, which marks the
+    template as complete, is written last.
+    """
+    from aiida.orm import Computer
+
+    cluster_base_dir = template_dir / 'cluster'
+    cluster_base_dir.mkdir()
+    manager = TemporaryProfileManager(
+        backend=backend, pgtest={
+            'base_dir': str(cluster_base_dir),
+            'no_cleanup': True
+        }
+    )
+    manager.create_profile()
+
+    workdir = template_dir / 'workdir'
+    workdir.mkdir()
+    computer = Computer(
+        label=LOCALHOST_LABEL,
+        description='localhost computer set up by aiida-testing',
+        hostname=LOCALHOST_LABEL,
+        workdir=str(workdir),
+        transport_type='local',
+        scheduler_type='direct'
+    )
+    computer.store()
+    computer.set_minimum_job_poll_interval(0.)
+    computer.configure()
+
+    if os.path.isdir(manager.repo):
+        shutil.copytree(manager.repo, template_dir / 'repository')
+    cluster_dir = manager.pg_cluster.cluster
+    # Stops the server, but keeps the cluster directory.
+    manager.destroy_all()
+
+    with open(template_dir / TEMPLATE_INFO_FILE, 'w') as info_file:
+        json.dump({'cluster': cluster_dir, 'backend': backend}, info_file)
+
+
+# The base class can not be checked, since aiida-core does not ship type information.
+class TemplateProfileManager(TemporaryProfileManager):  # type: ignore[misc,no-any-unimported]
+    """
+    A temporary profile manager which starts its database cluster from
+    a copy of the template cluster, instead of creating and migrating
+    a new database. The repository of the template is hardlinked, since
+    files in the repository are never modified once written.
+    """
+    def __init__(self, template_dir: pathlib.Path):
+        """
+        Parameters
+        ----------
+        template_dir :
+            Directory containing the template created by ``build_template``.
+        """
+        with open(template_dir / TEMPLATE_INFO_FILE) as info_file:
+            template_info = json.load(info_file)
+        super().__init__(
+            backend=template_info['backend'], pgtest={'copy_cluster': template_info['cluster']}
+        )
+        self._template_dir = template_dir
+
+    def create_aiida_db(self):
+        """
+        Connects to the copied cluster, which already contains the
+        database user and the AiiDA database.
+        """
+        if configuration.PROFILE is not None:
+            raise TestManagerError(
+                'AiiDA dbenv can not be loaded while creating a tests db environment'
+            )
+        if self.pg_cluster is None:
+            self.create_db_cluster()
+        self.postgres = Postgres(interactive=False, quiet=True, dbinfo=self.dbinfo)
+        self.dbinfo = self.postgres.dbinfo
+        self.profile_info['database_hostname'] = self.postgres.host_for_psycopg2
+        self.profile_info['database_port'] = self.postgres.port_for_psycopg2
+        self._has_test_db = True
+
+    def create_profile(self):
+        """
+        Links the template repository, and creates the profile. Since
+        the database is already migrated, the migration is a no-op.
+        """
+        if not self.root_dir:
+            self.root_dir = tempfile.mkdtemp()
+        template_repo = self._template_dir / 'repository'
+        if template_repo.is_dir():
+            shutil.copytree(template_repo, self.repo, copy_function=os.link)
+        super().create_profile()
+
+
+if __name__ == '__main__':
+    build_template(template_dir=pathlib.Path(sys.argv[1]), backend=sys.argv[2])
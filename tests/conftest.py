@@ -3,4 +3,4 @@
 Configuration file for pytest tests of aiida-testing.
 """
 
-pytest_plugins = ['aiida.manage.tests.pytest_fixtures', 'aiida_testing.mock_code']  # pylint: disable=invalid-name
+pytest_plugins = ['aiida.manage.tests.pytest_fixtures', 'aiida_testing.mock_code', 'pytester']  # pylint: disable=invalid-name
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Test the helpers of the mock code benchmark, and the artificial load
+applied by the mock code executable.
+"""
+
+import math
+
+import pytest
+
+from aiida_testing.mock_code._cli import simulate_load, write_output_padding
+from aiida_testing.mock_code._env_keys import EnvKeys
+from aiida_testing.mock_code._benchmark import BenchmarkLoad, _get_percentile
+
+
+@pytest.mark.parametrize(('percentile', 'expected'), [(0, 1), (50, 5), (90, 9), (99, 10),
+                                                      (100, 10)])
+def test_percentile(percentile, expected):
+    """
+    Check the nearest-rank percentiles of a list of values.
+    """
+    assert _get_percentile(list(range(1, 11)), percentile) == expected
+
+
+def test_percentile_empty():
+    """
+    Check that the percentile of no values is NaN.
+    """
+    assert math.isnan(_get_percentile([], 50))
+
+
+def test_load_env(monkeypatch, sleep_calls):  # pylint: disable=redefined-outer-name
+    """
+    Check that the load of the benchmark is passed to the mock code
+    executable through the environment.
+    """
+    for key, value in BenchmarkLoad(runtime=2.5, failure_rate=1.).get_env().items():
+        monkeypatch.setenv(key, str(value))
+    with pytest.raises(SystemExit):
+        simulate_load()
+    assert sleep_calls == [2.5]
+
+
+@pytest.fixture
+def sleep_calls(monkeypatch):
+    """
+    Replaces ``time.sleep`` in the mock code executable, and returns
+    the list of requested sleep times.
+    """
+    calls = []
+    monkeypatch.setattr('aiida_testing.mock_code._cli.time.sleep', calls.append)
+    return calls
+
+
+def test_simulate_load_unset(monkeypatch, sleep_calls):  # pylint: disable=redefined-outer-name
+    """
+    Check that no load is applied if the variables are not set.
+    """
+    monkeypatch.delenv(EnvKeys.RUNTIME.value, raising=False)
+    monkeypatch.delenv(EnvKeys.FAILURE_RATE.value, raising=False)
+    simulate_load()
+    assert sleep_calls == [0.]
+
+
+def test_simulate_load_runtime(monkeypatch, sleep_calls):  # pylint: disable=redefined-outer-name
+    """
+    Check that the run is delayed by the given runtime.
+    """
+    monkeypatch.setenv(EnvKeys.RUNTIME.value, '2.5')
+    monkeypatch.setenv(EnvKeys.FAILURE_RATE.value, '0.0')
+    simulate_load()
+    assert sleep_calls == [2.5]
+
+
+def test_simulate_load_failure(monkeypatch, sleep_calls):  # pylint: disable=redefined-outer-name,unused-argument
+    """
+    Check that the run fails if the failure rate is one.
+    """
+    monkeypatch.setenv(EnvKeys.FAILURE_RATE.value, '1')
+    with pytest.raises(SystemExit):
+        simulate_load()
+
+
+@pytest.mark.parametrize('output_size', [None, '0', '2500'])
+def test_output_padding(monkeypatch, capsysbinary, output_size):
+    """
+    Check that the given number of bytes is written to stderr, also
+    when it is not a multiple of the chunk size.
+    """
+    if output_size is None:
+        monkeypatch.delenv(EnvKeys.OUTPUT_SIZE.value, raising=False)
+    else:
+        monkeypatch.setenv(EnvKeys.OUTPUT_SIZE.value, output_size)
+    write_output_padding(chunk_size=1000)
+    captured = capsysbinary.readouterr()
+    assert captured.out == b''
+    assert captured.err == b'x' * int(output_size or 0)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Test deferring the runs of the "real" code to the end of the session.
+"""
+
+import pytest
+
+# Test module run through ``pytester``, in which the tests queue jobs
+# as the mock code executable would, if their result is missing.
+DEFERRED_TEST_MODULE = """
+import pathlib
+
+import pytest
+
+from aiida_testing.mock_code._cli import queue_job
+from aiida_testing.mock_code._deferred import DEFERRED_RECORDER_NAME
+
+DATA_DIR = pathlib.Path({data_dir!r})
+
+
+def _get_result(request, tmp_path, monkeypatch, res_dir):
+    if res_dir.exists():
+        # The tests are run again without deferring.
+        assert not request.config.getoption('mock_code_defer_record')
+        return (res_dir / 'out.txt').read_text()
+    recorder = request.config.pluginmanager.get_plugin(DEFERRED_RECORDER_NAME)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / '_aiidasubmit.sh').write_text('echo result > out.txt')
+    queue_job(
+        queue_dir=recorder.queue_dir,
+        res_dir=res_dir,
+        label='echo',
+        ignore_files=['_aiidasubmit.sh'],
+        delta_max_depth=0
+    )
+    pytest.fail('The result is missing.')
+
+
+def test_pending(request, tmp_path, monkeypatch):
+    assert _get_result(request, tmp_path, monkeypatch, DATA_DIR / 'mock-echo-aaaa') == 'result\\n'
+
+
+def test_broken_job(request, tmp_path, monkeypatch):
+    # The result can not be stored, since its parent is a file.
+    res_dir = DATA_DIR / 'blocker.txt' / 'mock-echo-bbbb'
+    assert _get_result(request, tmp_path, monkeypatch, res_dir) == 'result\\n'
+
+
+def test_failing():
+    assert False
+"""
+
+
+@pytest.fixture
+def deferred_test_module(pytester, tmp_path):
+    """
+    Creates the test module queueing jobs, and returns its data
+    directory.
+    """
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    (data_dir / 'blocker.txt').write_text('')
+    pytester.makepyfile(test_module=DEFERRED_TEST_MODULE.format(data_dir=str(data_dir)))
+    return data_dir
+
+
+def test_rerun(pytester, deferred_test_module):  # pylint: disable=redefined-outer-name
+    """
+    Check that a test with a missing result is skipped, and passes when
+    it is run again after the job was run, with the original options.
+    """
+    result = pytester.runpytest_subprocess(
+        '-p', 'aiida_testing.mock_code', '--mock-code-defer-record', '-k', 'test_pending'
+    )
+    # The summary of the session is written after the tests are run again.
+    result.stdout.fnmatch_lines([
+        'mock-echo-aaaa: stored',
+        '*running 1 tests with pending mock code results*',
+        '*1 passed*',
+        '*1 skipped*',
+    ])
+    assert result.ret == 0
+    assert (deferred_test_module / 'mock-echo-aaaa' / 'out.txt').read_text() == 'result\n'
+
+
+def test_deferred_in_addopts(pytester, deferred_test_module):  # pylint: disable=redefined-outer-name,unused-argument
+    """
+    Check that the tests are not deferred again when they are run
+    again, if deferring is enabled through ``addopts``.
+    """
+    pytester.makeini(
+        """
+        [pytest]
+        addopts = -p aiida_testing.mock_code --mock-code-defer-record
+    """
+    )
+    result = pytester.runpytest_subprocess('-k', 'test_pending')
+    result.stdout.fnmatch_lines(['*running 1 tests with pending mock code results*', '*1 passed*'])
+    assert result.ret == 0
+
+
+def test_failed_job(pytester, deferred_test_module):  # pylint: disable=redefined-outer-name,unused-argument
+    """
+    Check that tests whose job failed are not run again, and that the
+    session fails.
+    """
+    result = pytester.runpytest_subprocess(
+        '-p', 'aiida_testing.mock_code', '--mock-code-defer-record', '-k', 'test_broken_job'
+    )
+    result.stdout.fnmatch_lines([
+        'mock-echo-bbbb: failed*',
+        '*test_broken_job: not run again, since its mock code jobs failed',
+    ])
+    result.stdout.no_fnmatch_line('*running 1 tests with pending mock code results*')
+    assert result.ret == pytest.ExitCode.TESTS_FAILED
+
+
+def test_exit_status_kept(pytester, deferred_test_module):  # pylint: disable=redefined-outer-name,unused-argument
+    """
+    Check that the session fails if another test failed, even if the
+    tests run again pass.
+    """
+    result = pytester.runpytest_subprocess(
+        '-p', 'aiida_testing.mock_code', '--mock-code-defer-record', '-k',
+        'test_pending or test_failing'
+    )
+    result.stdout.fnmatch_lines(['*running 1 tests with pending mock code results*', '*1 passed*'])
+    assert result.ret == pytest.ExitCode.TESTS_FAILED
+
+
+def test_xdist_refused(pytester, deferred_test_module):  # pylint: disable=redefined-outer-name,unused-argument
+    """
+    Check that deferring can not be used with pytest-xdist.
+    """
+    pytest.importorskip('xdist')
+    result = pytester.runpytest_subprocess(
+        '-p', 'aiida_testing.mock_code', '--mock-code-defer-record', '-n', '2'
+    )
+    result.stderr.fnmatch_lines(['*--mock-code-defer-record can not be used together with*'])
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Test the delta-encoded storage of mock code results.
+"""
+
+import shutil
+
+import pytest
+
+from aiida_testing.mock_code._delta import (
+    DeltaBaseError, apply_delta, compute_delta, encode_deltas, list_entry_files, read_entry_file,
+    restore_delta_files
+)
+from aiida_testing.mock_code._metadata import write_metadata
+
+LOG_LINES = [f'iteration {i}: converged\n'.encode() for i in range(200)]
+
+
+def _store_entry(data_dir, name, energy, max_depth):
+    """
+    Stores a result with a log file which differs only in the energy,
+    encoding it as a delta if possible.
+    """
+    res_dir = data_dir / name
+    (res_dir / 'out').mkdir(parents=True)
+    (res_dir / 'out' /
+     'aiida.log').write_bytes(b''.join(LOG_LINES) + f'energy = {energy}\n'.encode())
+    (res_dir / 'small.txt').write_bytes(b'x')
+    delta = encode_deltas(res_dir=res_dir, label='pw', max_depth=max_depth)
+    write_metadata(res_dir, {} if delta is None else {'delta': delta})
+    return res_dir, delta
+
+
+@pytest.mark.parametrize(
+    'base, content', [
+        (b'a\nb\nc\n', b'a\nB\nc\nd'),
+        (b'', b'new\n'),
+        (b'old\r\nlines\r\n', b''),
+        (bytes(range(256)) * 4, bytes(range(255, -1, -1)) * 4),
+    ]
+)
+def test_roundtrip(base, content):
+    """
+    Check that applying a delta reconstructs the content exactly.
+    """
+    assert apply_delta(base, compute_delta(base, content)) == content
+
+
+def test_delta_chain(tmp_path, monkeypatch):
+    """
+    Check that results are stored as deltas against each other, that
+    the maximum chain depth is respected, and that the files can be
+    restored.
+    """
+    first, delta = _store_entry(tmp_path, 'mock-pw-0000', energy=1.0, max_depth=2)
+    assert delta is None
+    second, delta = _store_entry(tmp_path, 'mock-pw-1111', energy=1.1, max_depth=2)
+    assert delta['base'] == first.name
+    assert delta['depth'] == 1
+    assert list(delta['files']) == ['out/aiida.log']
+    assert not (second / 'out' / 'aiida.log').exists()
+    third, delta = _store_entry(tmp_path, 'mock-pw-2222', energy=1.11, max_depth=2)
+    assert delta['base'] == second.name
+    assert delta['depth'] == 2
+
+    for res_dir, energy in [(first, 1.0), (second, 1.1), (third, 1.11)]:
+        assert list_entry_files(res_dir) == ['out/aiida.log', 'small.txt']
+        assert read_entry_file(res_dir, 'out/aiida.log').endswith(f'energy = {energy}\n'.encode())
+
+    # a chain which has reached the maximum depth is not extended
+    _, delta = _store_entry(tmp_path, 'mock-pw-3333', energy=1.111, max_depth=1)
+    assert delta['depth'] == 1
+
+    workdir = tmp_path / 'workdir'
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    restore_delta_files(second)
+    assert (workdir / 'out' / 'aiida.log').read_bytes() == read_entry_file(second, 'out/aiida.log')
+
+
+def test_other_label(tmp_path):
+    """
+    Check that results with a different label are not used as a base.
+    """
+    _store_entry(tmp_path, 'mock-pw-extra-0000', energy=1.0, max_depth=2)
+    _, delta = _store_entry(tmp_path, 'mock-pw-1111', energy=1.0, max_depth=2)
+    assert delta is None
+
+
+def test_base_rerecorded(tmp_path):
+    """
+    Check that a delta is not applied to a base which has changed
+    since the delta was computed.
+    """
+    first, _ = _store_entry(tmp_path, 'mock-pw-0000', energy=1.0, max_depth=2)
+    second, _ = _store_entry(tmp_path, 'mock-pw-1111', energy=1.1, max_depth=2)
+    log_path = first / 'out' / 'aiida.log'
+    log_path.write_bytes(b'header\n' + log_path.read_bytes())
+    with pytest.raises(DeltaBaseError, match="'mock-pw-0000' has changed"):
+        read_entry_file(second, 'out/aiida.log')
+
+
+def test_base_removed(tmp_path):
+    """
+    Check that a clear error is raised if the base was removed, and
+    that a broken result is not used as a base.
+    """
+    first, _ = _store_entry(tmp_path, 'mock-pw-0000', energy=1.0, max_depth=2)
+    second, _ = _store_entry(tmp_path, 'mock-pw-1111', energy=1.1, max_depth=2)
+    shutil.rmtree(first)
+    with pytest.raises(DeltaBaseError, match="base 'mock-pw-0000'.* does not exist"):
+        read_entry_file(second, 'out/aiida.log')
+
+    _, delta = _store_entry(tmp_path, 'mock-pw-2222', energy=1.11, max_depth=2)
+    assert delta is None
@@ -3,6 +3,7 @@
 Test basic usage of the mock code on examples using aiida-diff.
 """
 
+import io
 import os
 import tempfile
 
@@ -114,3 +115,64 @@ def test_broken_code(mock_code_factory, generate_diff_inputs):  # pylint: disabl
     )
     assert node.is_finished_ok
     check_diff_output(res)
+
+
+def test_batch(mock_code_factory, mock_code_batch_runner, generate_diff_inputs):  # pylint: disable=redefined-outer-name
+    """
+    Check that a batch of mock calculations with different inputs can be
+    run concurrently, and that the results are returned in order.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        mock_code = mock_code_factory(
+            label='diff',
+            data_dir_abspath=temp_dir,
+            entry_point=CALC_ENTRY_POINT,
+            ignore_files=('_aiidasubmit.sh', 'file1.txt', 'file2.txt')
+        )
+
+        batch = []
+        for i in range(6):
+            inputs = generate_diff_inputs()
+            inputs['file2'] = orm.SinglefileData(
+                file=io.BytesIO(f'line {i}\n'.encode()), filename='file2.txt'
+            )
+            batch.append((CalculationFactory(CALC_ENTRY_POINT), {'code': mock_code, **inputs}))
+        results = mock_code_batch_runner(batch, max_concurrent=3)
+
+    assert len(results) == len(batch)
+    for i, ((_, inputs), (res, node)) in enumerate(zip(batch, results)):
+        assert node.is_finished_ok
+        assert node.inputs.file2.uuid == inputs['file2'].uuid
+        assert res['diff'].get_content().splitlines()[-1] == f'> line {i}'
+
+
+def test_caching(mock_code_factory, mock_code_caching, generate_diff_inputs, request):  # pylint: disable=redefined-outer-name,unused-argument
+    """
+    Check that mock codes with the same settings are reused, and that
+    identical calculations are taken from the cache.
+    """
+    mock_codes = [
+        mock_code_factory(
+            label='diff',
+            data_dir_abspath=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'),
+            entry_point=CALC_ENTRY_POINT,
+            ignore_files=('_aiidasubmit.sh', 'file*')
+        ) for _ in range(2)
+    ]
+    assert mock_codes[0].uuid == mock_codes[1].uuid
+
+    _, node1 = run_get_node(
+        CalculationFactory(CALC_ENTRY_POINT), code=mock_codes[0], **generate_diff_inputs()
+    )
+    res, node2 = run_get_node(
+        CalculationFactory(CALC_ENTRY_POINT), code=mock_codes[1], **generate_diff_inputs()
+    )
+    assert node2.is_finished_ok
+    if request.config.getoption('mock_code_record_usage'):
+        # Caching is disabled while the usage of results is recorded.
+        assert node2.get_cache_source() is None
+    else:
+        # The cache source may be an identical calculation of an earlier test.
+        assert node2.get_cache_source() is not None
+        assert orm.load_node(node2.get_cache_source()).get_hash() == node1.get_hash()
+    check_diff_output(res)
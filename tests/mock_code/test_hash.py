@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Test the hashing of the working directory of the mock code.
+"""
+
+import os
+import shutil
+import hashlib
+
+import pytest
+
+from aiida_testing.mock_code._cli import ENTRY_MARKER_FILE, get_hash
+
+
+def _make_parent(path, entry, content):
+    """
+    Creates the working directory of a previous mock code run, with a
+    large output folder.
+    """
+    (path / 'out').mkdir(parents=True)
+    (path / 'out' / 'data.bin').write_bytes(content)
+    (path / '.aiida').mkdir()
+    (path / ENTRY_MARKER_FILE).write_text(entry)
+    return path
+
+
+@pytest.fixture
+def sandbox(tmp_path, monkeypatch):
+    """
+    Creates a working directory containing an input file, and changes
+    into it.
+    """
+    workdir = tmp_path / 'sandbox'
+    workdir.mkdir()
+    (workdir / 'aiida.in').write_text('restart')
+    monkeypatch.chdir(workdir)
+    return workdir
+
+
+def test_regular_files(sandbox):  # pylint: disable=redefined-outer-name
+    """
+    Check that the hash of regular files depends on their names and
+    contents, but not on the '.aiida' folder.
+    """
+    (sandbox / 'sub').mkdir()
+    (sandbox / 'sub' / 'b.txt').write_text('b')
+    (sandbox / '.aiida').mkdir()
+    (sandbox / '.aiida' / 'calcinfo.json').write_text('{}')
+    expected = hashlib.md5(b'aiida.in' + b'restart' + b'b.txt' + b'b')
+    assert get_hash().hexdigest() == expected.hexdigest()
+
+
+def test_symlink_to_mock_run(sandbox, tmp_path):  # pylint: disable=redefined-outer-name
+    """
+    Check that a link into the working directory of a mock code run is
+    identified by the result directory of that run and the relative
+    path, independent of the location and contents of the target.
+    """
+    parent_1 = _make_parent(tmp_path / 'run_1', 'mock-pw-aaaa', b'1' * 1000)
+    parent_2 = _make_parent(tmp_path / 'run_2', 'mock-pw-aaaa', b'2' * 1000)
+    parent_3 = _make_parent(tmp_path / 'run_3', 'mock-pw-bbbb', b'1' * 1000)
+
+    os.symlink(parent_1 / 'out', sandbox / 'parent_out')
+    hash_1 = get_hash().hexdigest()
+    os.unlink(sandbox / 'parent_out')
+    os.symlink(parent_2 / 'out', sandbox / 'parent_out')
+    assert get_hash().hexdigest() == hash_1
+    os.unlink(sandbox / 'parent_out')
+    os.symlink(parent_3 / 'out', sandbox / 'parent_out')
+    assert get_hash().hexdigest() != hash_1
+
+
+def test_symlinked_directory(sandbox, tmp_path):  # pylint: disable=redefined-outer-name
+    """
+    Check that symlinked directories outside of mock code runs are
+    hashed by the names and contents of the files they contain,
+    independent of the location of the target.
+    """
+    target = tmp_path / 'scratch'
+    target.mkdir()
+    (target / 'data.bin').write_bytes(b'1')
+    os.symlink(target, sandbox / 'scratch')
+    hash_1 = get_hash().hexdigest()
+    (target / 'data.bin').write_bytes(b'2')
+    assert get_hash().hexdigest() != hash_1
+    hash_1 = get_hash().hexdigest()
+
+    (target / 'other.bin').write_bytes(b'3')
+    assert get_hash().hexdigest() != hash_1
+
+    other_target = tmp_path / 'other' / 'scratch'
+    shutil.copytree(target, other_target)
+    os.unlink(sandbox / 'scratch')
+    os.symlink(other_target, sandbox / 'scratch')
+    hash_2 = get_hash().hexdigest()
+    os.unlink(sandbox / 'scratch')
+    os.symlink(target, sandbox / 'scratch')
+    assert get_hash().hexdigest() == hash_2
+
+
+def test_symlinked_file(sandbox, tmp_path):  # pylint: disable=redefined-outer-name
+    """
+    Check that symlinked files outside of mock code runs are hashed by
+    their content, independent of the location of the target.
+    """
+    (tmp_path / 'pseudo').mkdir()
+    target = tmp_path / 'pseudo' / 'Si.upf'
+    target.write_bytes(b'pseudo')
+    os.symlink(target, sandbox / 'Si.upf')
+    expected = hashlib.md5(b'Si.upf' + b'pseudo' + b'aiida.in' + b'restart')
+    assert get_hash().hexdigest() == expected.hexdigest()
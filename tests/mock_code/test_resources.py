@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Test storing the resources used by the "real" code with the results,
+and reporting them when the results are used.
+"""
+
+import json
+
+import pytest
+
+from aiida_testing.mock_code._cli import (
+    SUBMIT_FILE, get_hash, run, run_submit_file, store_results
+)
+from aiida_testing.mock_code._env_keys import EnvKeys
+from aiida_testing.mock_code._metadata import METADATA_FILE, read_metadata
+
+SUBMIT_CONTENT = 'echo result > out.txt\n'
+
+
+@pytest.fixture
+def recorded_result(tmp_path, monkeypatch):
+    """
+    Runs a submit file in a working directory, and stores its results
+    in a data directory.
+    """
+    workdir = tmp_path / 'record'
+    workdir.mkdir()
+    (workdir / SUBMIT_FILE).write_text(SUBMIT_CONTENT)
+    monkeypatch.chdir(workdir)
+
+    res_dir = tmp_path / 'data' / f'mock-echo-{get_hash().hexdigest()}'
+    store_results(
+        res_dir=res_dir,
+        label='echo',
+        ignore_files=[SUBMIT_FILE],
+        resources=run_submit_file(),
+        delta_max_depth=0
+    )
+    return res_dir
+
+
+def test_stored_resources(recorded_result):  # pylint: disable=redefined-outer-name
+    """
+    Check that the resources used by the run are stored in the metadata
+    of the result.
+    """
+    assert sorted(path.name for path in recorded_result.iterdir()) == [METADATA_FILE, 'out.txt']
+    resources = read_metadata(recorded_result)['resources']
+    assert set(resources) == {'wall_time', 'cpu_time', 'max_rss', 'output_size'}
+    assert resources['wall_time'] > 0
+    assert resources['cpu_time'] >= 0
+    assert resources['max_rss'] > 0
+    assert resources['output_size'] == len('result\n')
+
+
+def test_replay(recorded_result, tmp_path, monkeypatch):  # pylint: disable=redefined-outer-name
+    """
+    Check that the metadata is not copied when the result is used, and
+    that the stored wall time is reported as saved.
+    """
+    workdir = tmp_path / 'replay'
+    workdir.mkdir()
+    (workdir / SUBMIT_FILE).write_text(SUBMIT_CONTENT)
+    monkeypatch.chdir(workdir)
+    usage_file = tmp_path / 'usage.jsonl'
+    for key, value in [
+        (EnvKeys.LABEL, 'echo'),
+        (EnvKeys.DATA_DIR, str(recorded_result.parent)),
+        (EnvKeys.EXECUTABLE_PATH, ''),
+        (EnvKeys.IGNORE_FILES, SUBMIT_FILE),
+        (EnvKeys.USAGE_FILE, str(usage_file)),
+    ]:
+        monkeypatch.setenv(key.value, value)
+
+    run()
+
+    assert (workdir / 'out.txt').read_text() == 'result\n'
+    assert not (workdir / METADATA_FILE).exists()
+    usage = json.loads(usage_file.read_text())
+    assert usage['entry'] == recorded_result.name
+    assert usage['saved_wall_time'] == read_metadata(recorded_result)['resources']['wall_time']
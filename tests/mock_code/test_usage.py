@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Test the selection of tests affected by changes to the mock code results.
+"""
+
+import json
+import shutil
+
+import pytest
+
+from aiida_testing.mock_code._usage import get_affected_tests, get_entry_fingerprints
+
+# Test module run through ``pytester``, in which each test appends a
+# line to the usage log as the mock code executable would.
+PLUGIN_TEST_MODULE = """
+import json
+
+from aiida_testing.mock_code._usage import USAGE_RECORDER_NAME
+
+
+def _use_entry(request, entry):
+    usage_recorder = request.config.pluginmanager.get_plugin(USAGE_RECORDER_NAME)
+    if usage_recorder is None:
+        return
+    with open(usage_recorder.usage_log.path, 'a') as log_file:
+        log_file.write(json.dumps({{
+            'label': 'diff', 'data_dir': {data_dir!r}, 'entry': entry, 'saved_wall_time': 1.,
+            'pending': {pending!r}
+        }}) + '\\n')
+
+
+def test_a(request):
+    _use_entry(request, 'mock-diff-aaaa')
+
+
+def test_b(request):
+    _use_entry(request, 'mock-diff-bbbb')
+
+
+def test_none():
+    pass
+"""
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    """
+    Creates a data directory with two results, and a baseline in which
+    each of them is used by a separate test.
+    """
+    for entry, content in [('mock-diff-aaaa', 'a'), ('mock-diff-broken-bbbb', 'b')]:
+        (tmp_path / entry).mkdir()
+        (tmp_path / entry / 'patch.diff').write_text(content)
+    data_dir = str(tmp_path)
+    return {
+        'executables': {
+            'diff': '/usr/bin/diff'
+        },
+        'entries': {
+            data_dir: get_entry_fingerprints(data_dir)
+        },
+        'tests': {
+            'test_a': [{
+                'label': 'diff',
+                'data_dir': data_dir,
+                'entry': 'mock-diff-aaaa'
+            }],
+            'test_b': [{
+                'label': 'diff-broken',
+                'data_dir': data_dir,
+                'entry': 'mock-diff-broken-bbbb'
+            }],
+        }
+    }
+
+
+def test_unchanged(baseline):  # pylint: disable=redefined-outer-name
+    """
+    Check that no test is affected if nothing changed.
+    """
+    assert get_affected_tests(baseline, executables={'diff': '/usr/bin/diff'}) == set()
+
+
+def test_rerecorded(baseline, tmp_path):  # pylint: disable=redefined-outer-name
+    """
+    Check that re-recording a result affects the test using it.
+    """
+    (tmp_path / 'mock-diff-aaaa' / 'patch.diff').write_text('changed')
+    assert get_affected_tests(baseline, executables={'diff': '/usr/bin/diff'}) == {'test_a'}
+
+
+def test_removed(baseline, tmp_path):  # pylint: disable=redefined-outer-name
+    """
+    Check that removing a result affects the test using it.
+    """
+    shutil.rmtree(tmp_path / 'mock-diff-broken-bbbb')
+    assert get_affected_tests(baseline, executables={'diff': '/usr/bin/diff'}) == {'test_b'}
+
+
+def test_added(baseline, tmp_path):  # pylint: disable=redefined-outer-name
+    """
+    Check that adding a result affects the tests using the same label.
+    """
+    (tmp_path / 'mock-diff-broken-cccc').mkdir()
+    assert get_affected_tests(baseline, executables={'diff': '/usr/bin/diff'}) == {'test_b'}
+
+
+def test_relocated(baseline, tmp_path):  # pylint: disable=redefined-outer-name
+    """
+    Check that data directories relative to the root directory are
+    resolved, such that the baseline can be used in another checkout.
+    """
+    root_dir = tmp_path / 'checkout'
+    shutil.copytree(tmp_path, root_dir / 'data', ignore=shutil.ignore_patterns('checkout'))
+    relative_baseline = {
+        'executables': baseline['executables'],
+        'entries': {
+            'data': baseline['entries'][str(tmp_path)]
+        },
+        'tests': {
+            nodeid: [{
+                **usage, 'data_dir': 'data'
+            } for usage in usages]
+            for nodeid, usages in baseline['tests'].items()
+        }
+    }
+    executables = {'diff': '/usr/bin/diff'}
+    assert get_affected_tests(relative_baseline, executables, root_dir=root_dir) == set()
+    (root_dir / 'data' / 'mock-diff-aaaa' / 'patch.diff').write_text('changed')
+    assert get_affected_tests(relative_baseline, executables, root_dir=root_dir) == {'test_a'}
+
+
+def test_executable_changed(baseline):  # pylint: disable=redefined-outer-name
+    """
+    Check that changing the configured executable affects the tests
+    using the corresponding label.
+    """
+    assert get_affected_tests(baseline, executables={'diff': '/bin/diff'}) == {'test_a'}
+
+
+@pytest.fixture
+def plugin_test_module(pytester):
+    """
+    Creates a data directory with two results, and a test module using
+    them through the usage log.
+    """
+    data_dir = pytester.path / 'data'
+    for entry in ['mock-diff-aaaa', 'mock-diff-bbbb']:
+        (data_dir / entry).mkdir(parents=True)
+        (data_dir / entry / 'patch.diff').write_text(entry)
+    pytester.makepyfile(
+        test_module=PLUGIN_TEST_MODULE.format(data_dir=str(data_dir), pending=False)
+    )
+    return data_dir
+
+
+def test_record_and_select(pytester, plugin_test_module):  # pylint: disable=redefined-outer-name
+    """
+    Check that the usage of each test is recorded, and that only the
+    tests using a changed result are selected.
+    """
+    data_dir = plugin_test_module
+    usage_path = pytester.path / 'usage.json'
+    pytester.runpytest('-p', 'aiida_testing.mock_code',
+                       f'--mock-code-record-usage={usage_path}').assert_outcomes(passed=3)
+
+    with open(usage_path) as usage_file:
+        usage_baseline = json.load(usage_file)
+    # The data directory is stored relative to the root directory.
+    assert list(usage_baseline['entries']) == ['data']
+    tests = usage_baseline['tests']
+    assert all(usage['data_dir'] == 'data' for usages in tests.values() for usage in usages)
+    assert {
+        nodeid.split('::')[-1]: [usage['entry'] for usage in usages]
+        for nodeid, usages in tests.items()
+    } == {
+        'test_a': ['mock-diff-aaaa'],
+        'test_b': ['mock-diff-bbbb'],
+        'test_none': []
+    }
+
+    (data_dir / 'mock-diff-bbbb' / 'patch.diff').write_text('changed')
+    result = pytester.runpytest(
+        '-p', 'aiida_testing.mock_code', f'--mock-code-select-changed={usage_path}', '-v'
+    )
+    result.assert_outcomes(passed=1, deselected=2)
+    result.stdout.fnmatch_lines(['*::test_b PASSED*'])
+
+
+def test_record_xdist(pytester, plugin_test_module):  # pylint: disable=redefined-outer-name,unused-argument
+    """
+    Check that the usage recorded by pytest-xdist workers is combined
+    in the usage file.
+    """
+    pytest.importorskip('xdist')
+    usage_path = pytester.path / 'usage.json'
+    result = pytester.runpytest_subprocess(
+        '-p', 'aiida_testing.mock_code', '-n', '2', f'--mock-code-record-usage={usage_path}'
+    )
+    result.assert_outcomes(passed=3)
+    result.stdout.fnmatch_lines(['aiida-testing: 2 mock code runs, saving 2.0s *'])
+
+    with open(usage_path) as usage_file:
+        tests = json.load(usage_file)['tests']
+    assert sorted(nodeid.split('::')[-1] for nodeid in tests) == ['test_a', 'test_b', 'test_none']
+
+
+def test_record_pending(pytester, plugin_test_module):  # pylint: disable=redefined-outer-name
+    """
+    Check that tests which are waiting for deferred results keep their
+    previously recorded usage.
+    """
+    data_dir = plugin_test_module
+    usage_path = pytester.path / 'usage.json'
+    pytester.runpytest('-p', 'aiida_testing.mock_code',
+                       f'--mock-code-record-usage={usage_path}').assert_outcomes(passed=3)
+    old_usage = [{'label': 'diff', 'data_dir': str(data_dir), 'entry': 'mock-diff-0000'}]
+    with open(usage_path) as usage_file:
+        baseline = json.load(usage_file)
+    for nodeid in baseline['tests']:
+        baseline['tests'][nodeid] = old_usage
+    with open(usage_path, 'w') as usage_file:
+        json.dump(baseline, usage_file)
+
+    pytester.makepyfile(test_module=PLUGIN_TEST_MODULE.format(data_dir=str(data_dir), pending=True))
+    pytester.runpytest('-p', 'aiida_testing.mock_code',
+                       f'--mock-code-record-usage={usage_path}').assert_outcomes(passed=3)
+    with open(usage_path) as usage_file:
+        tests = json.load(usage_file)['tests']
+    assert {nodeid.split('::')[-1]: usages
+            for nodeid, usages in tests.items()} == {
+                'test_a': old_usage,
+                'test_b': old_usage,
+                'test_none': []
+            }
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Test setting up the test profile from the template database.
+"""
+
+import os
+
+import pytest
+
+CONFTEST = """
+import sys
+import subprocess
+
+import pytest
+
+from aiida_testing.template_profile._fixtures import TEMPLATE_DIR_NAME
+
+pytest_plugins = ['aiida.manage.tests.pytest_fixtures', 'aiida_testing.template_profile']
+
+
+@pytest.fixture(scope='session')
+def template_probe_file(tmp_path_factory):
+    from aiida.manage.tests import get_test_backend_name
+
+    # Build the template in advance, to add a file to its repository.
+    template_dir = tmp_path_factory.getbasetemp() / TEMPLATE_DIR_NAME
+    template_dir.mkdir()
+    subprocess.run([
+        sys.executable, '-m', 'aiida_testing.template_profile._manager',
+        str(template_dir), get_test_backend_name()
+    ], check=True)
+    probe_file = template_dir / 'repository' / 'probe.txt'
+    probe_file.parent.mkdir(exist_ok=True)
+    probe_file.write_text('probe')
+    return probe_file
+
+
+@pytest.fixture(scope='session', autouse=True)
+def aiida_profile(template_probe_file, aiida_template_profile):
+    yield aiida_template_profile
+"""
+
+TEST_MODULE = """
+import os
+import pathlib
+
+
+def test_localhost(template_probe_file):
+    from aiida.orm import Computer
+
+    computer = Computer.objects.get(label='localhost-test')
+    assert computer.get_workdir() == str(template_probe_file.parents[1] / 'workdir')
+
+
+def test_repository(template_probe_file):
+    from aiida.manage.configuration import get_profile
+
+    repository_path = pathlib.Path(get_profile().repository_path)
+    assert os.path.samefile(repository_path / 'probe.txt', template_probe_file)
+"""
+
+
+def test_template_profile(pytester):
+    """
+    Check that the test profile created from the template contains the
+    ``localhost-test`` computer, and that its repository is hardlinked
+    to the template repository.
+    """
+    if os.environ.get('AIIDA_TEST_PROFILE'):
+        pytest.skip('An existing test profile is used instead of the template.')
+    pytester.makeconftest(CONFTEST)
+    pytester.makepyfile(test_template=TEST_MODULE)
+    pytester.runpytest_subprocess().assert_outcomes(passed=2)